@@ -1,349 +1,934 @@
-# jarvis.py
-import os
-import time
-import webbrowser
-import traceback
-import requests
-import speech_recognition as sr
-
-# TTS choices: gTTS + pygame (online) with pyttsx3 fallback (offline)
-from gtts import gTTS
-import pygame
-import pyttsx3
-from datetime import datetime 
-
-# Local modules (examples below)
-# client.py will export OPENAI_API_KEY and NEWS_API_KEY (strings)
-# musicLibrary.py will export music (dict mapping normalized song-name -> url)
-try:
-    import client
-except Exception:
-    client = None
-
-try:
-    import musicLibrary
-except Exception:
-    musicLibrary = None
-
-# Optional OpenAI wrapper (if you have openai package configured)
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
-
-# Config: default to values from client.py if present
-OPENAI_API_KEY = getattr(client, "OPENAI_API_KEY", None)
-NEWS_API_KEY = getattr(client, "NEWS_API_KEY", None)
-WEATHER_API_KEY = getattr(client, "WEATHER_API_KEY", None) 
-
-# Use a local temp file for gTTS playback
-TMP_TTS = "tmp_tts.mp3"
-
-# Initialize pyttsx3 (fallback)
-pytt_engine = pyttsx3.init()
-
-def speak_with_pygame(text):
-    """Use gTTS to create an mp3 and play with pygame. Falls back to pyttsx3 on errors."""
-    try:
-        tts = gTTS(text=text, lang="en")
-        tts.save(TMP_TTS)
-
-        pygame.mixer.init()
-        pygame.mixer.music.load(TMP_TTS)
-        pygame.mixer.music.play()
-
-        # wait until playback finishes
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-
-        pygame.mixer.music.unload()
-        pygame.mixer.quit()
-        if os.path.exists(TMP_TTS):
-            os.remove(TMP_TTS)
-    except Exception as e:
-        # fallback to pyttsx3
-        print("gTTS/pygame failed, falling back to pyttsx3:", e)
-        try:
-            pytt_engine.say(text)
-            pytt_engine.runAndWait()
-        except Exception as e2:
-            print("pytt fallback also failed:", e2)
-
-def speak(text):
-    # short wrapper to avoid blocking too long text at once
-    if not text:
-        return
-    # chunk long text into smaller sentences so TTS works reliably
-    chunks = [c.strip() for c in text.split(".") if c.strip()]
-    for chunk in chunks:
-        speak_with_pygame(chunk + ".")
-
-def aiProcess(command):
-    """Send the command to OpenAI (if configured). Returns string or error message."""
-    if OPENAI_API_KEY is None or OpenAI is None:
-        return "AI not configured. Please set OPENAI_API_KEY in client.py and install openai package."
-
-    try:
-        client_api = OpenAI(api_key=OPENAI_API_KEY)
-        resp = client_api.chat.completions.create(
-            model="gpt-5",
-            messages=[
-                {"role": "system", "content": "You are Jarvis, a virtual assistant and you are skilled in general tasks like alexa and google home."},
-                {"role": "user", "content": command}
-            ],
-            max_tokens=250,
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception as e:
-        print("Error calling OpenAI:", e)
-        traceback.print_exc()
-        return "Sorry, I couldn't reach the AI service."
-
-def get_weather(city="New Delhi"):
-    if not WEATHER_API_KEY:
-        return "Weather API key missing in client.py"
-
-    try:
-        url = (
-            f"https://api.openweathermap.org/data/2.5/weather?q={city}"
-            f"&appid={WEATHER_API_KEY}&units=metric"
-        )
-        r = requests.get(url, timeout=8)
-        data = r.json()
-
-        if data.get("cod") != 200:
-            return "Couldn't fetch the weather right now."
-
-        temp = data["main"]["temp"]
-        condition = data["weather"][0]["description"]
-        humidity = data["main"]["humidity"]
-
-        return f"The weather in {city} is {condition} with a temperature of {temp} degrees Celsius and humidity of {humidity} percent."
-
-    except Exception as e:
-        print("Weather error:", e)
-        return "Error fetching weather."
-
-
-
-def get_headlines(country="in", page_size=5):
-    """Return list of top headline titles (uses NEWS_API_KEY)."""
-    if not NEWS_API_KEY:
-        return ["News API key not configured. Put NEWS_API_KEY in client.py."]
-    try:
-        url = f"https://newsapi.org/v2/top-headlines?country=in&apiKey={NEWS_API_KEY}"
-        r = requests.get(url, timeout=8)
-        if r.status_code != 200:
-            print("News API HTTP", r.status_code, r.text)
-            return [f"Failed to fetch news: HTTP {r.status_code}"]
-        data = r.json()
-        articles = data.get("articles", [])
-        if not articles:
-            return ["No news articles found."]
-        return [a.get("title", "Untitled") for a in articles]
-    except Exception as e:
-        print("Exception fetching news:", e)
-        return ["Error fetching news."]
-
-def normalize_key(s: str) -> str:
-    return " ".join(s.lower().strip().split())
-
-def handle_play_command(command_text):
-    """Handle 'play' command. Supports:
-       - 'play <song name>' where musicLibrary.music is a mapping
-       - 'play <url>' opens the URL directly
-    """
-    remainder = command_text.lower().replace("play", "", 1).strip()
-    if not remainder:
-        speak("Which song should I play?")
-        return
-
-    # If it looks like a URL, open it
-    if remainder.startswith("http://") or remainder.startswith("https://"):
-        webbrowser.open(remainder)
-        speak(f"Playing from URL.")
-        return
-
-    # If musicLibrary available, search for best match
-    if musicLibrary and hasattr(musicLibrary, "music"):
-        key = normalize_key(remainder)
-        # direct match
-        if key in musicLibrary.music:
-            url = musicLibrary.music[key]
-            webbrowser.open(url)
-            speak(f"Playing {remainder}.")
-            return
-        # try partial substring match
-        for k in musicLibrary.music:
-            if key in k:
-                webbrowser.open(musicLibrary.music[k])
-                speak(f"Playing {k}.")
-                return
-        # try startswith
-        for k in musicLibrary.music:
-            if k.startswith(key):
-                webbrowser.open(musicLibrary.music[k])
-                speak(f"Playing {k}.")
-                return
-
-    # fallback: try search on YouTube
-    query = remainder.replace(" ", "+")
-    url = f"https://www.youtube.com/results?search_query={query}"
-    webbrowser.open(url)
-    speak(f"Couldn't find the exact song locally. Searching YouTube for {remainder}.")
-
-def processCommand(c):
-    c = c.strip()
-    if not c:
-        return
-
-    lower = c.lower()
-
-    try:
-        if "date" in lower:
-            today = datetime.now().strftime("%A, %d %B %Y")
-            speak(f"Today's date is {today}.")
-            return
-
-        # TIME
-        if "time" in lower:
-            now = datetime.now().strftime("%I:%M %p")
-            speak(f"The time is {now}.")
-            return
-
-        # WEATHER (default: New Delhi)
-        if "weather" in lower:
-            speak("Checking the weather.")
-            report = get_weather("New Delhi")
-            speak(report)
-            return
-            
-        if "open google" in lower:
-            webbrowser.open("https://google.com")
-            speak("Opening Google.")
-
-        elif "open facebook" in lower:
-            webbrowser.open("https://facebook.com")
-            speak("Opening Facebook.")
-
-        elif "open youtube" in lower:
-            webbrowser.open("https://youtube.com")
-            speak("Opening YouTube.")
-
-        elif "open linkedin" in lower:
-            webbrowser.open("https://linkedin.com")
-            speak("Opening LinkedIn.")
-
-        elif lower.startswith("play"):
-            handle_play_command(c)
-
-        elif "news" in lower:
-            speak("Fetching the top headlines.")
-            headlines = get_headlines()
-            for h in headlines:
-                speak(h)
-                time.sleep(0.2)
-
-        else:
-            # fallback to AI
-            speak("Let me check.")
-            answer = aiProcess(c)
-            speak(answer)
-
-    except Exception as e:
-        print("Error in processCommand:", e)
-        traceback.print_exc()
-        speak("Sorry, I encountered an error while processing the command.")
-
-def listen_for_wakeword(recognizer, mic, wakeword="jarvis", timeout=6, phrase_time_limit=5):
-    """Listen until the wakeword is heard. Returns True when wakeword detected."""
-    try:
-        print("Adjusting for ambient noise... (1 sec)")
-        with mic as source:
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-        print("Listening for wake word...")
-        with mic as source:
-            audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
-        try:
-            text = recognizer.recognize_google(audio)
-            print("Heard (wake stage):", text)
-            if wakeword.lower() in text.lower():
-                return True
-        except sr.UnknownValueError:
-            # nothing recognized
-            return False
-        except sr.RequestError as e:
-            print("Speech recognition request error:", e)
-            return False
-    except Exception as e:
-        print("Exception listening for wakeword:", e)
-    return False
-
-def listen_for_command(recognizer, mic, timeout=None, phrase_time_limit=6):
-    """Listen once and return recognized string or None."""
-    try:
-        with mic as source:
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
-        try:
-            text = recognizer.recognize_google(audio)
-            print("Command recognized:", text)
-            return text
-        except sr.UnknownValueError:
-            return None
-        except sr.RequestError as e:
-            print("Speech recognition request error:", e)
-            return None
-    except Exception as e:
-        print("Exception in listen_for_command:", e)
-        return None
-
-def main_loop():
-    recognizer = sr.Recognizer()
-    mic = sr.Microphone()
-
-    speak("Initializing Jarvis.")
-    time.sleep(0.3)
-
-    try:
-        while True:
-            try:
-                got_wake = listen_for_wakeword(recognizer, mic)
-                if not got_wake:
-                    # small sleep to avoid busy-looping
-                    continue
-
-                speak("Yes?")
-                # listen for full command (allow more time)
-                cmd = listen_for_command(recognizer, mic, timeout=6, phrase_time_limit=8)
-
-                if not cmd:
-                    speak("Sorry, I didn't catch that.")
-                    continue
-
-                # user might say "Jarvis play despacito" or just "play despacito"
-                # remove wakeword if present
-                cmd_clean = cmd
-                if cmd_clean.lower().startswith("jarvis"):
-                    cmd_clean = cmd_clean[len("jarvis"):].strip()
-
-                processCommand(cmd_clean)
-
-            except KeyboardInterrupt:
-                speak("Shutting down. Goodbye.")
-                break
-            except Exception as e:
-                print("Main loop exception:", e)
-                traceback.print_exc()
-                # continue listening after errors
-                time.sleep(0.5)
-
-    finally:
-        try:
-            pygame.mixer.quit()
-        except Exception:
-            pass
-
-if __name__ == "__main__":
-    main_loop()
-
+# jarvis.py
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import os
+import queue
+import re
+import struct
+import tempfile
+import threading
+import time
+import wave
+import webbrowser
+import traceback
+from collections import Counter, defaultdict
+from urllib.parse import quote_plus
+from datetime import datetime
+
+# Heavy third-party modules (requests, speech_recognition, gtts, pygame,
+# pyttsx3, openai) are imported lazily on first use - together they cost
+# hundreds of ms at startup (pygame alone initializes SDL), and most
+# commands only need a subset of them.
+requests = None
+sr = None
+gTTS = None
+pygame = None
+pytt_engine = None
+
+def _ensure_requests():
+    global requests
+    if requests is None:
+        import requests as _requests
+        requests = _requests
+    return requests
+
+def _ensure_sr():
+    global sr
+    if sr is None:
+        import speech_recognition as _sr
+        sr = _sr
+    return sr
+
+def _ensure_gtts():
+    global gTTS
+    if gTTS is None:
+        from gtts import gTTS as _gTTS
+        gTTS = _gTTS
+    return gTTS
+
+def _ensure_pygame():
+    global pygame
+    if pygame is None:
+        import pygame as _pygame
+        pygame = _pygame
+    return pygame
+
+def _get_pytt_engine():
+    """Create the pyttsx3 fallback engine on first use."""
+    global pytt_engine
+    if pytt_engine is None:
+        import pyttsx3
+        pytt_engine = pyttsx3.init()
+    return pytt_engine
+
+# Local modules (examples below)
+# client.py will export OPENAI_API_KEY and NEWS_API_KEY (strings)
+# musicLibrary.py will export music (dict mapping normalized song-name -> url)
+try:
+    import client
+except Exception:
+    client = None
+
+try:
+    import musicLibrary
+except Exception:
+    musicLibrary = None
+
+# Optional local neural TTS (piper-tts). When a voice model is available this
+# becomes the default engine: synthesis is on-device and sub-100ms, vs.
+# seconds (and 10-20 s spikes) for the gTTS HTTPS round-trip.
+try:
+    from piper import PiperVoice
+except Exception:
+    PiperVoice = None
+
+# Optional streaming speech recognition (vosk + pyaudio). With a local model,
+# partial hypotheses arrive while the user is still speaking, so wake-word
+# detection and command recognition skip the post-utterance network round-trip
+# that recognize_google pays.
+try:
+    import vosk
+except Exception:
+    vosk = None
+
+try:
+    import pyaudio
+except Exception:
+    pyaudio = None
+
+# Optional on-device wake-word engine (Porcupine). A tiny DNN evaluates each
+# 30 ms frame in microseconds on CPU, so the idle loop does zero network I/O;
+# STT only runs after the wake word has already fired.
+try:
+    import pvporcupine
+except Exception:
+    pvporcupine = None
+
+# Optional fast fuzzy matcher for song-title lookup (C-implemented).
+try:
+    from rapidfuzz import fuzz
+except Exception:
+    fuzz = None
+
+# Config: default to values from client.py if present
+OPENAI_API_KEY = getattr(client, "OPENAI_API_KEY", None)
+NEWS_API_KEY = getattr(client, "NEWS_API_KEY", None)
+WEATHER_API_KEY = getattr(client, "WEATHER_API_KEY", None)
+
+# Set OFFLINE_TTS = False in client.py to prefer gTTS voice quality over
+# local synthesis latency. PIPER_MODEL_PATH points at a downloaded .onnx voice.
+OFFLINE_TTS = getattr(client, "OFFLINE_TTS", True)
+PIPER_MODEL_PATH = getattr(client, "PIPER_MODEL_PATH", None)
+
+# Shared HTTP session: keep-alive reuses the TCP+TLS connection across news
+# and weather calls instead of paying a fresh handshake every request.
+_http = None
+
+def _get_http():
+    global _http
+    if _http is None:
+        _http = _ensure_requests().Session()
+    return _http
+
+_openai_client = None
+
+def _get_openai_client():
+    """Create the OpenAI client once and reuse its connection pool."""
+    global _openai_client
+    if _openai_client is None and OPENAI_API_KEY:
+        try:
+            from openai import OpenAI
+        except Exception:
+            return None
+        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
+_piper = None
+if PiperVoice and OFFLINE_TTS and PIPER_MODEL_PATH:
+    try:
+        _piper = PiperVoice.load(PIPER_MODEL_PATH)
+    except Exception as e:
+        print("Piper voice load failed, using gTTS/pyttsx3:", e)
+
+# Streaming recognizer config. Point VOSK_MODEL_PATH in client.py at an
+# unpacked model directory (e.g. vosk-model-small-en-us-0.15).
+VOSK_MODEL_PATH = getattr(client, "VOSK_MODEL_PATH", "model-small-en")
+STT_SAMPLE_RATE = 16000
+STT_FRAME_SAMPLES = STT_SAMPLE_RATE * 20 // 1000  # 20 ms frames
+
+_vosk_model = None
+if vosk and pyaudio and os.path.isdir(VOSK_MODEL_PATH):
+    try:
+        _vosk_model = vosk.Model(VOSK_MODEL_PATH)
+    except Exception as e:
+        print("Vosk model load failed, using Google STT:", e)
+
+# Porcupine needs a Picovoice access key (free tier) in client.py.
+PICOVOICE_ACCESS_KEY = getattr(client, "PICOVOICE_ACCESS_KEY", None)
+
+_porcupine = None
+if pvporcupine and pyaudio and PICOVOICE_ACCESS_KEY:
+    try:
+        _porcupine = pvporcupine.create(
+            access_key=PICOVOICE_ACCESS_KEY, keywords=["jarvis"]
+        )
+    except Exception as e:
+        print("Porcupine init failed, using STT wake detection:", e)
+
+# On-disk cache for synthesized speech: repeated phrases ("Yes?", "Opening Google.")
+# become a local file read instead of a network round-trip to Google.
+TTS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "jarvis_tts")
+
+# Phrases spoken on almost every session; synthesized ahead of time so the
+# first interaction doesn't wait on the network.
+COMMON_PHRASES = [
+    "Initializing Jarvis.",
+    "Yes?",
+    "Sorry, I didn't catch that.",
+    "Let me check.",
+    "Opening Google.",
+    "Opening Facebook.",
+    "Opening YouTube.",
+    "Opening LinkedIn.",
+    "Checking the weather.",
+    "Fetching the top headlines.",
+    "Shutting down. Goodbye.",
+]
+
+# The mixer is opened once per process; init/quit per utterance costs an SDL
+# audio-device open/close cycle (tens-hundreds of ms) for every sentence.
+_mixer_inited = False
+
+def _ensure_mixer():
+    """Initialize pygame.mixer once; safe to call from anywhere."""
+    global _mixer_inited
+    if _mixer_inited:
+        return
+    _ensure_pygame()
+    pygame.mixer.init(frequency=24000, buffer=512)
+    _mixer_inited = True
+
+def _wait_for_playback():
+    """Block until the current track ends. pygame.time.wait keeps this off
+    the event queue, which needs the (uninitialized) video subsystem."""
+    while pygame.mixer.music.get_busy():
+        pygame.time.wait(50)
+
+@functools.lru_cache(maxsize=256)
+def _synth_to_path(text, lang="en"):
+    """Synthesize text with gTTS and return a path to the cached mp3.
+
+    Results are cached in-memory (LRU) and on disk under TTS_CACHE_DIR so
+    repeated utterances skip the network entirely.
+    """
+    digest = hashlib.sha1(f"{text}|{lang}".encode("utf-8")).hexdigest()
+    path = os.path.join(TTS_CACHE_DIR, f"{digest}.mp3")
+    if os.path.exists(path):
+        return path
+
+    buf = io.BytesIO()
+    _ensure_gtts()(text=text, lang=lang).write_to_fp(buf)
+
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    # write via a per-writer unique temp name then rename, so concurrent
+    # synthesizers of the same phrase (e.g. prewarm racing speak) never
+    # truncate each other's partial file and a half-written mp3 is never served
+    fd, tmp_path = tempfile.mkstemp(dir=TTS_CACHE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(tmp_path, path)
+    except Exception:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+def prewarm_tts_cache(phrases=COMMON_PHRASES):
+    """Synthesize the common phrases in a background thread so they're hot."""
+    def _warm():
+        for phrase in phrases:
+            try:
+                _synth_to_path(phrase)
+            except Exception as e:
+                print("TTS prewarm failed for", repr(phrase), ":", e)
+                return  # likely offline; don't hammer the API
+    threading.Thread(target=_warm, daemon=True).start()
+
+def _speak_fallback(text):
+    """Last-resort offline speech via pyttsx3."""
+    try:
+        engine = _get_pytt_engine()
+        engine.say(text)
+        engine.runAndWait()
+    except Exception as e:
+        print("pytt fallback also failed:", e)
+
+def _play_path(path):
+    """Play an mp3 file through the persistent mixer, blocking until done."""
+    _ensure_mixer()
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+    _wait_for_playback()
+    pygame.mixer.music.unload()
+
+def _speak_piper(text):
+    """Synthesize with the local Piper voice and play, fully on-device."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        _piper.synthesize(text, wav)
+    buf.seek(0)
+    _ensure_mixer()
+    channel = pygame.mixer.Sound(file=buf).play()
+    while channel and channel.get_busy():
+        pygame.time.wait(10)
+
+def speak_with_pygame(text):
+    """Speak one utterance: Piper (local) when configured, else gTTS + pygame,
+    with pyttsx3 as the last resort."""
+    if _piper is not None:
+        try:
+            _speak_piper(text)
+            return
+        except Exception as e:
+            print("Piper synthesis failed, falling back to gTTS:", e)
+    try:
+        _play_path(_synth_to_path(text))
+    except Exception as e:
+        # fallback to pyttsx3
+        print("gTTS/pygame failed, falling back to pyttsx3:", e)
+        _speak_fallback(text)
+
+# Sentinel marking the end of a synthesis stream.
+_TTS_DONE = object()
+
+# Sentence splitter: break after .!? followed by whitespace, so "Dr. Smith",
+# "3.14", and trailing punctuation survive, unlike text.split(".").
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+
+def _produce_tts(chunks, q):
+    """Producer side of the speak() pipeline: synthesize each chunk and queue
+    (chunk, path) pairs; path is None when synthesis failed."""
+    for chunk in chunks:
+        try:
+            q.put((chunk, _synth_to_path(chunk)))
+        except Exception as e:
+            print("TTS synthesis failed for chunk:", e)
+            q.put((chunk, None))
+    q.put(_TTS_DONE)
+
+def _speak_chunks(chunks):
+    """Speak a list of utterances back to back; each play call returns only
+    once playback has actually finished, so no extra pause is needed."""
+    # Local synthesis has no network latency to hide; speak chunks directly.
+    if _piper is not None or len(chunks) <= 1:
+        for chunk in chunks:
+            speak_with_pygame(chunk)
+        return
+
+    # Pipeline: synthesize chunk N+1 (network-bound) while chunk N plays.
+    # The bounded queue keeps the producer at most two chunks ahead.
+    q = queue.Queue(maxsize=2)
+    producer = threading.Thread(target=_produce_tts, args=(chunks, q), daemon=True)
+    producer.start()
+    while True:
+        item = q.get()
+        if item is _TTS_DONE:
+            break
+        chunk, path = item
+        if path is None:
+            _speak_fallback(chunk)
+            continue
+        try:
+            _play_path(path)
+        except Exception as e:
+            print("Playback failed, falling back to pyttsx3:", e)
+            _speak_fallback(chunk)
+    producer.join()
+
+def speak(text):
+    # short wrapper to avoid blocking too long text at once
+    if not text:
+        return
+    # chunk long text into sentences so TTS works reliably; the regex keeps
+    # the original punctuation on each chunk
+    chunks = [s for s in _SENT_RE.split(text.strip()) if s]
+    _speak_chunks(chunks)
+
+# First sentence terminator in a streaming buffer: same boundary semantics
+# as _SENT_RE, so "3.14" and "Dr. Smith" don't flush mid-token. Punctuation
+# at the very end of the buffer waits for the next delta (or the final tail
+# flush) since the stream may still be mid-number.
+_SENT_END_RE = re.compile(r"[.!?](?=\s)")
+
+def aiProcess(command):
+    """Stream the OpenAI reply (if configured), yielding complete sentences
+    as tokens arrive so speech can start before generation finishes."""
+    client_api = _get_openai_client()
+    if client_api is None:
+        yield "AI not configured. Please set OPENAI_API_KEY in client.py and install openai package."
+        return
+
+    try:
+        resp = client_api.chat.completions.create(
+            model="gpt-5",
+            messages=[
+                {"role": "system", "content": "You are Jarvis, a virtual assistant and you are skilled in general tasks like alexa and google home."},
+                {"role": "user", "content": command}
+            ],
+            # short questions rarely need long answers; cap output so the
+            # round-trip doesn't scale with an unused token budget
+            max_tokens=64 if len(command.split()) < 8 else 256,
+            stream=True,
+        )
+        buf = ""
+        for event in resp:
+            buf += event.choices[0].delta.content or ""
+            while (m := _SENT_END_RE.search(buf)) is not None:
+                sentence = buf[:m.end()].strip()
+                buf = buf[m.end():]
+                if sentence:
+                    yield sentence
+        tail = buf.strip()
+        if tail:
+            yield tail
+    except Exception as e:
+        print("Error calling OpenAI:", e)
+        traceback.print_exc()
+        yield "Sorry, I couldn't reach the AI service."
+
+def get_weather(city="New Delhi"):
+    if not WEATHER_API_KEY:
+        return "Weather API key missing in client.py"
+
+    try:
+        url = (
+            f"https://api.openweathermap.org/data/2.5/weather?q={city}"
+            f"&appid={WEATHER_API_KEY}&units=metric"
+        )
+        r = _get_http().get(url, timeout=8)
+        data = r.json()
+
+        if data.get("cod") != 200:
+            return "Couldn't fetch the weather right now."
+
+        temp = data["main"]["temp"]
+        condition = data["weather"][0]["description"]
+        humidity = data["main"]["humidity"]
+
+        return f"The weather in {city} is {condition} with a temperature of {temp} degrees Celsius and humidity of {humidity} percent."
+
+    except Exception as e:
+        print("Weather error:", e)
+        return "Error fetching weather."
+
+
+
+# Headlines change slowly but users re-ask often; cache them briefly.
+NEWS_TTL = 60  # seconds
+_news_cache = (0.0, None)  # (fetched_at, headlines)
+
+def get_headlines(country="in", page_size=5):
+    """Return list of top headline titles (uses NEWS_API_KEY)."""
+    global _news_cache
+    if not NEWS_API_KEY:
+        return ["News API key not configured. Put NEWS_API_KEY in client.py."]
+
+    fetched_at, cached = _news_cache
+    if cached is not None and time.time() - fetched_at < NEWS_TTL:
+        return cached
+
+    try:
+        url = f"https://newsapi.org/v2/top-headlines?country=in&apiKey={NEWS_API_KEY}"
+        r = _get_http().get(url, timeout=8)
+        if r.status_code != 200:
+            print("News API HTTP", r.status_code, r.text)
+            return [f"Failed to fetch news: HTTP {r.status_code}"]
+        data = r.json()
+        articles = data.get("articles", [])
+        if not articles:
+            return ["No news articles found."]
+        headlines = [a.get("title", "Untitled") for a in articles]
+        _news_cache = (time.time(), headlines)
+        return headlines
+    except Exception as e:
+        print("Exception fetching news:", e)
+        return ["Error fetching news."]
+
+def normalize_key(s: str) -> str:
+    return " ".join(s.lower().strip().split())
+
+def _iter_trigrams(s):
+    return (s[i:i + 3] for i in range(len(s) - 2))
+
+# Song index built once at import: normalized-title -> url, plus a trigram
+# index for fuzzy matches. Lookups are O(1) per trigram instead of three
+# full scans of the library per play-command.
+_norm2url = {}
+_trigrams = defaultdict(set)
+if musicLibrary and hasattr(musicLibrary, "music"):
+    for _title, _url in musicLibrary.music.items():
+        _norm = normalize_key(_title)
+        _norm2url[_norm] = _url
+        for _tri in _iter_trigrams(_norm):
+            _trigrams[_tri].add(_norm)
+
+def _lookup_song(key):
+    """Return (matched_title, url) for a normalized query, or None.
+
+    Exact dict hit first; otherwise rank candidates by trigram overlap and
+    (when rapidfuzz is installed) partial-ratio similarity.
+    """
+    url = _norm2url.get(key)
+    if url is not None:
+        return key, url
+
+    counts = Counter()
+    for tri in _iter_trigrams(key):
+        for cand in _trigrams.get(tri, ()):
+            counts[cand] += 1
+    if not counts:
+        return None
+
+    candidates = [cand for cand, _ in counts.most_common(5)]
+    if fuzz is not None:
+        best = max(candidates, key=lambda cand: fuzz.partial_ratio(key, cand))
+        if fuzz.partial_ratio(key, best) >= 70:
+            return best, _norm2url[best]
+        return None
+
+    # without rapidfuzz, require the best candidate to share most of the
+    # query's trigrams
+    best = candidates[0]
+    if counts[best] >= max(1, (len(key) - 2) // 2):
+        return best, _norm2url[best]
+    return None
+
+def handle_play_command(command_text, lower=None):
+    """Handle 'play' command. Supports:
+       - 'play <song name>' where musicLibrary.music is a mapping
+       - 'play <url>' opens the URL directly
+
+    `lower` is the already-lowercased command from processCommand, so the
+    string isn't lowercased (and allocated) a second time here.
+    """
+    if lower is None:
+        lower = command_text.lower()
+    if lower.startswith("play "):
+        remainder = lower[5:].strip()
+    else:
+        remainder = lower.replace("play", "", 1).strip()
+    if not remainder:
+        speak("Which song should I play?")
+        return
+
+    # If it looks like a URL, open it
+    if remainder.startswith(("http://", "https://")):
+        webbrowser.open(remainder)
+        speak(f"Playing from URL.")
+        return
+
+    # Indexed lookup: exact hit, then trigram/fuzzy fallback
+    if _norm2url:
+        match = _lookup_song(normalize_key(remainder))
+        if match:
+            title, url = match
+            webbrowser.open(url)
+            speak(f"Playing {title}.")
+            return
+
+    # fallback: try search on YouTube; quote_plus keeps &, ? and non-ASCII
+    # song names from breaking the URL
+    url = f"https://www.youtube.com/results?search_query={quote_plus(remainder)}"
+    webbrowser.open(url)
+    speak(f"Couldn't find the exact song locally. Searching YouTube for {remainder}.")
+
+def _intent_date(c):
+    today = datetime.now().strftime("%A, %d %B %Y")
+    speak(f"Today's date is {today}.")
+
+def _intent_time(c):
+    now = datetime.now().strftime("%I:%M %p")
+    speak(f"The time is {now}.")
+
+def _intent_weather(c):
+    speak("Checking the weather.")
+    report = get_weather("New Delhi")
+    speak(report)
+
+def _open_site(url, phrase):
+    def _handler(c):
+        webbrowser.open(url)
+        speak(phrase)
+    return _handler
+
+def _intent_news(c):
+    speak("Fetching the top headlines.")
+    headlines = get_headlines()
+    if _piper is not None or len(headlines) <= 1:
+        _speak_chunks(headlines)
+        return
+    # fire all gTTS requests at once so their network time overlaps, then
+    # play in order; headline 1 starts as soon as its own synthesis lands
+    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as ex:
+        futures = [ex.submit(_synth_to_path, h) for h in headlines]
+        for headline, future in zip(headlines, futures):
+            try:
+                _play_path(future.result())
+            except Exception as e:
+                print("Headline TTS failed, falling back to pyttsx3:", e)
+                _speak_fallback(headline)
+
+def _intent_ai(c):
+    # a worker thread drains the token stream into a queue of sentences
+    # while the interim line plays, then each sentence is spoken as soon
+    # as it is complete - no waiting for the full 250-token completion
+    sentences = queue.Queue()
+
+    def _stream_ai():
+        for sentence in aiProcess(c):
+            sentences.put(sentence)
+        sentences.put(_TTS_DONE)
+
+    worker = threading.Thread(target=_stream_ai, daemon=True)
+    worker.start()
+    speak("Let me check.")
+    while True:
+        sentence = sentences.get()
+        if sentence is _TTS_DONE:
+            break
+        speak(sentence)
+    worker.join()
+
+def _local_math(m):
+    a, op, b = float(m.group(1)), m.group(2), float(m.group(3))
+    if op in ("plus", "+"):
+        value = a + b
+    elif op in ("minus", "-"):
+        value = a - b
+    elif op in ("times", "x", "*"):
+        value = a * b
+    else:
+        if b == 0:
+            return "I can't divide by zero."
+        value = a / b
+    return f"That's {value:g}."
+
+# Deterministic answers that don't need a 250-token LLM round-trip. Checked
+# right before the AI fallback; time/date/weather are already keyword intents.
+LOCAL_HANDLERS = [
+    (re.compile(r"^(hello|hi|hey)\b"), lambda m: "Hello! How can I help you?"),
+    (re.compile(r"\bwho are you\b|\bwhat(?:'s| is) your name\b"),
+     lambda m: "I am Jarvis, your virtual assistant."),
+    # anchored on an arithmetic lead-in and the end of the command so
+    # digit-operator-digit fragments inside free text ("in 1939-1945",
+    # "a 4 x 4 truck") still go to the AI
+    (re.compile(r"\b(?:what(?:'s| is)|calculate|compute)\s+"
+                r"(-?\d+(?:\.\d+)?)\s*(plus|minus|times|divided by|[-+*/x])\s*"
+                r"(-?\d+(?:\.\d+)?)\s*\??\s*$"),
+     _local_math),
+    (re.compile(r"\bthank(?:s| you)\b"), lambda m: "You're welcome."),
+]
+
+# Keyword intents in priority order ("play ..." is a prefix fast path checked
+# between the open-* intents and news, matching the old elif chain). The
+# alternation regex is compiled once so dispatch is a single C-level scan of
+# the command instead of one substring search per intent.
+_INTENTS = [
+    ("date", _intent_date),
+    ("time", _intent_time),
+    ("weather", _intent_weather),
+    ("open google", _open_site("https://google.com", "Opening Google.")),
+    ("open facebook", _open_site("https://facebook.com", "Opening Facebook.")),
+    ("open youtube", _open_site("https://youtube.com", "Opening YouTube.")),
+    ("open linkedin", _open_site("https://linkedin.com", "Opening LinkedIn.")),
+]
+_INTENT_RE = re.compile(
+    "|".join(re.escape(kw) for kw, _ in _INTENTS) + "|news"
+)
+
+def processCommand(c):
+    c = c.strip()
+    if not c:
+        return
+
+    lower = c.lower()
+
+    try:
+        matched = {m.group() for m in _INTENT_RE.finditer(lower)}
+        for kw, handler in _INTENTS:
+            if kw in matched:
+                handler(c)
+                return
+
+        if lower.startswith("play"):
+            handle_play_command(c, lower)
+        elif "news" in matched:
+            _intent_news(c)
+        else:
+            # deterministic local answers before paying for the LLM
+            for pattern, handler in LOCAL_HANDLERS:
+                m = pattern.search(lower)
+                if m:
+                    speak(handler(m))
+                    return
+            _intent_ai(c)
+
+    except Exception as e:
+        print("Error in processCommand:", e)
+        traceback.print_exc()
+        speak("Sorry, I encountered an error while processing the command.")
+
+def _open_pcm_stream():
+    """Open a raw 16 kHz mono pyaudio input stream for the streaming recognizer."""
+    pa = pyaudio.PyAudio()
+    stream = pa.open(
+        format=pyaudio.paInt16,
+        channels=1,
+        rate=STT_SAMPLE_RATE,
+        input=True,
+        frames_per_buffer=STT_FRAME_SAMPLES,
+    )
+    return pa, stream
+
+def listen_for_wakeword_porcupine():
+    """Run Porcupine over raw mic frames until the 'jarvis' keyword fires."""
+    pa = pyaudio.PyAudio()
+    stream = pa.open(
+        format=pyaudio.paInt16,
+        channels=1,
+        rate=_porcupine.sample_rate,
+        input=True,
+        frames_per_buffer=_porcupine.frame_length,
+    )
+    try:
+        print("Listening for wake word (Porcupine)...")
+        unpack = struct.Struct("h" * _porcupine.frame_length).unpack_from
+        while True:
+            pcm = unpack(stream.read(_porcupine.frame_length, exception_on_overflow=False))
+            if _porcupine.process(pcm) >= 0:
+                return True
+    except Exception as e:
+        print("Exception in Porcupine wakeword listen:", e)
+        return False
+    finally:
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
+
+def listen_for_wakeword_streaming(wakeword="jarvis"):
+    """Feed 20 ms frames to Vosk and fire on the first partial containing the
+    wakeword - no network, no per-window buffering."""
+    rec = vosk.KaldiRecognizer(_vosk_model, STT_SAMPLE_RATE)
+    pa, stream = _open_pcm_stream()
+    try:
+        print("Listening for wake word (streaming)...")
+        while True:
+            frame = stream.read(STT_FRAME_SAMPLES, exception_on_overflow=False)
+            if rec.AcceptWaveform(frame):
+                text = json.loads(rec.Result()).get("text", "")
+            else:
+                text = json.loads(rec.PartialResult()).get("partial", "")
+            if wakeword in text.lower():
+                return True
+    except Exception as e:
+        print("Exception in streaming wakeword listen:", e)
+        return False
+    finally:
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
+
+def listen_for_command_streaming(phrase_time_limit=8):
+    """Stream frames to Vosk and return the transcript as soon as its
+    endpointer finalizes the utterance, or None on silence/timeouts."""
+    rec = vosk.KaldiRecognizer(_vosk_model, STT_SAMPLE_RATE)
+    pa, stream = _open_pcm_stream()
+    deadline = time.time() + phrase_time_limit
+    try:
+        while time.time() < deadline:
+            frame = stream.read(STT_FRAME_SAMPLES, exception_on_overflow=False)
+            if rec.AcceptWaveform(frame):
+                text = json.loads(rec.Result()).get("text", "").strip()
+                if text:
+                    print("Command recognized:", text)
+                    return text
+        text = json.loads(rec.FinalResult()).get("text", "").strip()
+        if text:
+            print("Command recognized:", text)
+            return text
+        return None
+    except Exception as e:
+        print("Exception in streaming command listen:", e)
+        return None
+    finally:
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
+
+def listen_for_wakeword(recognizer, source, wakeword="jarvis", timeout=6, phrase_time_limit=5):
+    """Listen until the wakeword is heard. Returns True when wakeword detected.
+
+    `source` is the long-lived microphone stream opened in main_loop; the
+    recognizer is assumed already calibrated - no per-call ambient-noise
+    adjustment and no device re-open."""
+    try:
+        print("Listening for wake word...")
+        audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        try:
+            text = recognizer.recognize_google(audio)
+            print("Heard (wake stage):", text)
+            if wakeword.lower() in text.lower():
+                return True
+        except sr.UnknownValueError:
+            # nothing recognized
+            return False
+        except sr.RequestError as e:
+            print("Speech recognition request error:", e)
+            return False
+    except Exception as e:
+        print("Exception listening for wakeword:", e)
+    return False
+
+def listen_for_command(recognizer, source, timeout=None, phrase_time_limit=6):
+    """Listen once on the shared mic stream and return recognized string or None."""
+    try:
+        audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        try:
+            text = recognizer.recognize_google(audio)
+            print("Command recognized:", text)
+            return text
+        except sr.UnknownValueError:
+            return None
+        except sr.RequestError as e:
+            print("Speech recognition request error:", e)
+            return None
+    except Exception as e:
+        print("Exception in listen_for_command:", e)
+        return None
+
+# Ambient noise drifts slowly; recalibrate every 5 minutes instead of
+# paying 0.5-1 s of forced silence on every single listen call.
+RECALIBRATE_INTERVAL = 300  # seconds
+
+# Set by the timer, consumed by main_loop between listens: calibration must
+# not read the mic stream while recognizer.listen is blocked on it (PortAudio
+# streams are not safe for concurrent readers).
+_recalibrate_needed = threading.Event()
+
+def _calibrate(recognizer, source, duration=1.0):
+    """One ambient-noise calibration pass on the shared mic stream."""
+    try:
+        recognizer.adjust_for_ambient_noise(source, duration=duration)
+        print("Ambient noise calibrated; energy_threshold =", recognizer.energy_threshold)
+    except Exception as e:
+        print("Ambient calibration failed:", e)
+
+def _schedule_recalibration():
+    """Periodically flag main_loop to recalibrate at its next safe point."""
+    def _mark():
+        _recalibrate_needed.set()
+        _schedule_recalibration()
+
+    timer = threading.Timer(RECALIBRATE_INTERVAL, _mark)
+    timer.daemon = True
+    timer.start()
+
+def main_loop():
+    # The sr.Microphone stream only backs the Google-STT fallback; with a
+    # Vosk model both listeners open their own pyaudio streams, and a second
+    # capture stream on the same device fails on exclusive-access ALSA setups.
+    use_google_stt = _vosk_model is None
+
+    recognizer = None
+    source = None
+    mic_stack = contextlib.ExitStack()
+    if use_google_stt:
+        _ensure_sr()
+        recognizer = sr.Recognizer()
+        mic = sr.Microphone()
+
+        # Open the mic stream once for the whole session: re-entering the
+        # context between wake-word and command listens reopens the audio
+        # device (~50-200 ms on ALSA/PulseAudio).
+        source = mic_stack.enter_context(mic)
+
+        print("Adjusting for ambient noise... (1 sec)")
+        _calibrate(recognizer, source)
+        _schedule_recalibration()
+
+    try:
+        _ensure_mixer()
+    except Exception as e:
+        print("Mixer init failed (will fall back to pyttsx3):", e)
+
+    prewarm_tts_cache()
+    speak("Initializing Jarvis.")
+    time.sleep(0.3)
+
+    try:
+        while True:
+            try:
+                # safe point: nothing is reading the mic stream here
+                if _recalibrate_needed.is_set() and source is not None:
+                    _recalibrate_needed.clear()
+                    _calibrate(recognizer, source, duration=0.5)
+
+                if _porcupine is not None:
+                    got_wake = listen_for_wakeword_porcupine()
+                elif _vosk_model is not None:
+                    got_wake = listen_for_wakeword_streaming()
+                else:
+                    got_wake = listen_for_wakeword(recognizer, source)
+                if not got_wake:
+                    # small sleep to avoid busy-looping when the listener
+                    # fails fast (e.g. device errors)
+                    time.sleep(0.5)
+                    continue
+
+                speak("Yes?")
+                # listen for full command (allow more time)
+                if _vosk_model is not None:
+                    cmd = listen_for_command_streaming(phrase_time_limit=8)
+                else:
+                    cmd = listen_for_command(recognizer, source, timeout=6, phrase_time_limit=8)
+
+                if not cmd:
+                    speak("Sorry, I didn't catch that.")
+                    continue
+
+                # user might say "Jarvis play despacito" or just "play despacito"
+                # remove wakeword if present
+                cmd_clean = cmd
+                if cmd_clean.lower().startswith("jarvis"):
+                    cmd_clean = cmd_clean[len("jarvis"):].strip()
+
+                processCommand(cmd_clean)
+
+            except KeyboardInterrupt:
+                speak("Shutting down. Goodbye.")
+                break
+            except Exception as e:
+                print("Main loop exception:", e)
+                traceback.print_exc()
+                # continue listening after errors
+                time.sleep(0.5)
+
+    finally:
+        try:
+            mic_stack.close()
+        except Exception:
+            pass
+        try:
+            if _mixer_inited:
+                pygame.mixer.quit()
+        except Exception:
+            pass
+
+if __name__ == "__main__":
+    main_loop()
+